@@ -6,12 +6,22 @@ Statistical validation and visualization of CMB echo patterns
 
 import json
 import numpy as np
+from plot_utils import HEADLESS, save_figure  # Picks the backend; before pyplot
 import matplotlib.pyplot as plt
 from scipy import stats
 import pandas as pd
 
+try:
+    import orjson
+except ImportError:
+    orjson = None  # Optional: falls back to the stdlib json module
+
 def load_results():
     """Load the CMB analysis results"""
+    if orjson is not None:
+        with open('real_cmb_results.json', 'rb') as f:
+            return orjson.loads(f.read())
+    
     with open('real_cmb_results.json', 'r') as f:
         return json.load(f)
 
@@ -21,8 +31,12 @@ def statistical_analysis(results):
     print("=" * 60)
     
     matches = results['top_matches']
-    all_correlations = [m['correlation'] for m in matches]
-    separations = [m['separation_degrees'] for m in matches]
+    all_correlations = np.fromiter((m['correlation'] for m in matches),
+                                   dtype=np.float64, count=len(matches))
+    abs_correlations = np.abs(all_correlations)
+    mean_abs_correlation = abs_correlations.mean()
+    separations = np.fromiter((m['separation_degrees'] for m in matches),
+                              dtype=np.float64, count=len(matches))
     
     # Basic statistics
     print(f"📊 Dataset Overview:")
@@ -35,13 +49,13 @@ def statistical_analysis(results):
     print(f"\n📈 Correlation Statistics:")
     print(f"  Maximum correlation: {results['max_correlation']:.4f}")
     print(f"  Mean correlation: {results['mean_correlation']:.4f}")
-    print(f"  Top 20 mean correlation: {np.mean(np.abs(all_correlations)):.4f}")
-    print(f"  Top 20 std deviation: {np.std(all_correlations):.4f}")
+    print(f"  Top 20 mean correlation: {mean_abs_correlation:.4f}")
+    print(f"  Top 20 std deviation: {all_correlations.std():.4f}")
     
     # Angular separation analysis
-    sep_90 = sum(1 for s in separations if 85 <= s <= 95)
-    sep_180 = sum(1 for s in separations if 175 <= s <= 185)
-    sep_270 = sum(1 for s in separations if 265 <= s <= 275)
+    # One comparison per predicted angle (rows) across all separations
+    in_bands = np.abs(separations - np.array([[90.0], [180.0], [270.0]])) <= 5
+    sep_90, sep_180, sep_270 = in_bands.sum(axis=1).tolist()
     
     print(f"\n🌀 Angular Separation Analysis (Top 20 matches):")
     print(f"  Near 90° (85-95°): {sep_90} matches")
@@ -51,7 +65,6 @@ def statistical_analysis(results):
     
     # Statistical significance test
     # Null hypothesis: correlations are random (mean = 0)
-    abs_correlations = np.abs(all_correlations)
     t_stat, p_value = stats.ttest_1samp(abs_correlations, 0)
     
     print(f"\n🎯 Statistical Significance:")
@@ -68,7 +81,10 @@ def statistical_analysis(results):
     
     return {
         'correlations': all_correlations,
+        'abs_correlations': abs_correlations,
+        'mean_abs_correlation': mean_abs_correlation,
         'separations': separations,
+        'at_predicted_angle': in_bands.any(axis=0),
         'sep_90': sep_90,
         'sep_180': sep_180,
         'sep_270': sep_270,
@@ -86,10 +102,13 @@ def create_discovery_plots(results, stats):
     
     # Plot 1: Correlation strength distribution
     ax1 = axes[0, 0]
-    correlations = stats['correlations']
-    ax1.hist(np.abs(correlations), bins=15, alpha=0.7, edgecolor='black', color='skyblue')
-    ax1.axvline(np.mean(np.abs(correlations)), color='red', linestyle='--', linewidth=2,
-               label=f'Mean: {np.mean(np.abs(correlations)):.3f}')
+    abs_correlations = stats['abs_correlations']
+    mean_abs_correlation = stats['mean_abs_correlation']
+    counts, edges = np.histogram(abs_correlations, bins=15)
+    ax1.bar(edges[:-1], counts, width=np.diff(edges), align='edge',
+            alpha=0.7, edgecolor='black', color='skyblue')
+    ax1.axvline(mean_abs_correlation, color='red', linestyle='--', linewidth=2,
+               label=f'Mean: {mean_abs_correlation:.3f}')
     ax1.set_xlabel('Absolute Correlation Coefficient')
     ax1.set_ylabel('Number of Echo Matches')
     ax1.set_title('Echo Correlation Strength\n(Top 20 Matches)')
@@ -99,7 +118,9 @@ def create_discovery_plots(results, stats):
     # Plot 2: Angular separation distribution
     ax2 = axes[0, 1]
     separations = stats['separations']
-    ax2.hist(separations, bins=15, alpha=0.7, edgecolor='black', color='orange')
+    counts, edges = np.histogram(separations, bins=15)
+    ax2.bar(edges[:-1], counts, width=np.diff(edges), align='edge',
+            alpha=0.7, edgecolor='black', color='orange')
     ax2.axvline(90, color='red', linestyle='--', alpha=0.7, label='90° (Quarter)')
     ax2.axvline(180, color='red', linestyle='--', alpha=0.7, label='180° (Antipodal)')
     ax2.axvline(270, color='red', linestyle='--', alpha=0.7, label='270° (Three-quarter)')
@@ -111,9 +132,12 @@ def create_discovery_plots(results, stats):
     
     # Plot 3: Correlation vs Separation scatter
     ax3 = axes[0, 2]
-    colors = ['red' if 85 <= s <= 95 or 175 <= s <= 185 or 265 <= s <= 275 else 'blue' 
-              for s in separations]
-    ax3.scatter(separations, np.abs(correlations), c=colors, alpha=0.7, s=60)
+    predicted = stats['at_predicted_angle']
+    # One rasterized collection per colour instead of per-point colours
+    ax3.scatter(separations[predicted], abs_correlations[predicted],
+                color='red', alpha=0.7, s=60, rasterized=True)
+    ax3.scatter(separations[~predicted], abs_correlations[~predicted],
+                color='blue', alpha=0.7, s=60, rasterized=True)
     ax3.set_xlabel('Angular Separation (degrees)')
     ax3.set_ylabel('Absolute Correlation')
     ax3.set_title('Echo Strength vs Separation\n(Red = Predicted Angles)')
@@ -138,7 +162,7 @@ def create_discovery_plots(results, stats):
     # Plot 5: Statistical significance
     ax5 = axes[1, 1]
     significance_data = ['Random\nExpectation', 'Observed\nCorrelations']
-    significance_values = [0, np.mean(np.abs(correlations))]
+    significance_values = [0, mean_abs_correlation]
     colors = ['gray', 'red']
     bars = ax5.bar(significance_data, significance_values, color=colors, alpha=0.7)
     ax5.set_ylabel('Mean Absolute Correlation')
@@ -182,9 +206,11 @@ FLAT LOOP UNIVERSE DISCOVERY SUMMARY
             bbox=dict(boxstyle="round,pad=0.5", facecolor="lightblue", alpha=0.8))
     
     plt.tight_layout()
-    plt.savefig('flat_loop_universe_discovery.png', dpi=300, bbox_inches='tight')
+    save_figure(fig, 'flat_loop_universe_discovery.png', dpi=300, bbox_inches='tight')
     print("📁 Saved: flat_loop_universe_discovery.png")
-    plt.show()
+    if not HEADLESS:
+        plt.show()
+    plt.close(fig)
 
 def generate_research_summary(results, stats):
     """Generate a research summary for publication"""
@@ -4,35 +4,73 @@ Real CMB Data Analysis for Flat Loop Universe Theory
 Works without healpy - uses numpy and scipy to read FITS files
 """
 
+import sys
 import numpy as np
+from plot_utils import HEADLESS, save_figure  # Picks the backend; before pyplot
 import matplotlib.pyplot as plt
 from scipy import signal
 from scipy.spatial.distance import cdist
 import struct
 import json
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 from pathlib import Path
 
+try:
+    import numba
+except ImportError:
+    numba = None  # Optional: falls back to batched NumPy reductions
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # Optional: falls back to the stdlib json module
+
+try:
+    import mpl_scatter_density  # Registers the 'scatter_density' projection
+except ImportError:
+    mpl_scatter_density = None  # Optional: dense scatters stay rasterized points
+
+# Above this many matches the separation scatter is drawn as a density map
+DENSITY_SCATTER_MIN_POINTS = 5000
+# Below this many window samples (pairs x patch size) the NumPy path runs
+# serially whatever n_workers says; starting worker processes (which
+# re-import everything on spawn platforms) would cost more than it saves
+POOL_MIN_WINDOW_SAMPLES = 1 << 30
+
+# Columnar echo match table: one row per patch pair above threshold
+MATCH_DTYPE = np.dtype([
+    ('location1', np.int64),
+    ('location2', np.int64),
+    ('correlation', np.float64),
+    ('separation_pixels', np.int64),
+    ('separation_degrees', np.float64),
+    ('patch_size', np.int64)
+])
+
 def read_fits_simple(filename):
     """
     Simple FITS file reader without astropy/healpy
-    Reads the primary HDU data array
+    Memory-maps the primary HDU data array, returned in native byte order
     """
     print(f"Reading FITS file: {filename}")
     
     try:
         with open(filename, 'rb') as f:
-            # Read FITS header
+            # Read FITS header a whole 2880-byte block (36 cards) per read
             header_cards = []
             while True:
-                card = f.read(80).decode('ascii', errors='ignore')
-                header_cards.append(card)
-                if card.startswith('END'):
+                block = f.read(2880)
+                if len(block) < 2880:
+                    raise ValueError("FITS header has no END card")
+                cards = [block[i:i + 80].decode('ascii', errors='ignore')
+                         for i in range(0, 2880, 80)]
+                header_cards.extend(cards)
+                if any(card.startswith('END') for card in cards):
                     break
             
-            # Calculate header size (multiple of 2880 bytes)
-            header_size = len(header_cards) * 80
-            header_blocks = (header_size + 2879) // 2880
-            total_header_size = header_blocks * 2880
+            # Header size is a whole number of blocks
+            total_header_size = f.tell()
             
             # Find data parameters from header
             naxis = None
@@ -49,9 +87,6 @@ def read_fits_simple(filename):
             
             print(f"FITS info: NAXIS={naxis}, NAXIS1={naxis1}, BITPIX={bitpix}")
             
-            # Seek to data start
-            f.seek(total_header_size)
-            
             # Read data based on BITPIX
             if bitpix == -32:  # 32-bit float
                 dtype = '>f4'  # Big-endian float32
@@ -62,11 +97,20 @@ def read_fits_simple(filename):
             else:
                 dtype = '>f4'  # Default to float32
             
-            # Read the data array
-            data = np.frombuffer(f.read(), dtype=dtype)
+            # Map the data array instead of reading it; pages load on access
+            f.seek(0, 2)
+            n_available = (f.tell() - total_header_size) // np.dtype(dtype).itemsize
             
             if naxis1:
-                data = data[:naxis1]  # Trim to expected size
+                n_available = min(n_available, naxis1)  # Trim to expected size
+            
+            data = np.memmap(filename, dtype=dtype, mode='r',
+                             offset=total_header_size, shape=(n_available,))
+            
+            # Swap FITS big-endian data to native byte order once, so later
+            # reductions don't pay a per-element byteswap on every pass
+            if not data.dtype.isnative:
+                data = data.astype(data.dtype.newbyteorder('='))
             
             print(f"Read {len(data)} data points")
             print(f"Data range: {np.min(data):.3e} to {np.max(data):.3e}")
@@ -77,23 +121,159 @@ def read_fits_simple(filename):
         print(f"Error reading FITS file: {e}")
         return None
 
-def analyze_cmb_correlations(cmb_data, patch_size=1000, n_samples=5000, min_correlation=0.1):
+def pearson_from_sums(sx, sy, sxx, syy, sxy, patch_size):
+    """
+    Pearson r from the sums of x, y, x*x, y*y and x*y over a window pair
+    The sums are of values shifted by each window's first sample, which
+    keeps the variance subtraction well conditioned. Flat windows get NaN
+    """
+    mx = sx / patch_size
+    my = sy / patch_size
+    var_x = sxx / patch_size - mx * mx
+    var_y = syy / patch_size - my * my
+    # What is left of a flat window's variance is rounding; call it zero
+    var_x[var_x <= 1e-10 * sxx / patch_size] = 0.0
+    var_y[var_y <= 1e-10 * syy / patch_size] = 0.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (sxy / patch_size - mx * my) / np.sqrt(var_x * var_y)
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _window_sums_numba(data, starts1, starts2, patch_size):
+        n_starts, n_separations = starts2.shape
+        sums = np.empty((5, n_starts, n_separations))
+        for i in numba.prange(n_starts):
+            start1 = starts1[i]
+            shift1 = np.float64(data[start1])
+            for j in range(n_separations):
+                start2 = starts2[i, j]
+                shift2 = np.float64(data[start2])
+                # float64 sums of the values shifted by each window's first sample
+                sx = sy = sxx = syy = sxy = 0.0
+                for k in range(patch_size):
+                    x = data[start1 + k] - shift1
+                    y = data[start2 + k] - shift2
+                    sx += x
+                    sy += y
+                    sxx += x * x
+                    syy += y * y
+                    sxy += x * y
+                sums[0, i, j] = sx
+                sums[1, i, j] = sy
+                sums[2, i, j] = sxx
+                sums[3, i, j] = syy
+                sums[4, i, j] = sxy
+        return sums
+
+def normalized_windows(data, starts, patch_size):
+    """
+    Centred, unit-norm copies of the windows data[start:start+patch_size]
+    Pearson r between two windows is then a plain dot product
+    Each window is centred and scaled from its own values (two passes),
+    so flat windows come out as NaN
+    """
+    # Zero-copy view of every length-patch_size window; rows are indexed by start
+    windows = np.lib.stride_tricks.sliding_window_view(data, patch_size)
+    centred = windows[starts].astype(np.float64)
+    centred -= centred.mean(axis=-1, keepdims=True)
+    norm = np.sqrt(np.square(centred).sum(axis=-1, keepdims=True))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        centred /= norm
+    return centred.astype(data.dtype, copy=False)
+
+def window_correlations_blocked(data, starts1, starts2, patch_size, block_size=512):
+    """
+    Batched NumPy version of window_correlations, block by block
+    """
+    # Gathering windows copies them, so work through the starts in blocks
+    # to keep the temporaries small however many samples are requested.
+    # Each first window is normalised once and reused for every separation.
+    correlations = np.empty(starts2.shape)
+    for lo in range(0, len(starts1), block_size):
+        hi = lo + block_size
+        patches1 = normalized_windows(data, starts1[lo:hi], patch_size)
+        patches2 = normalized_windows(data, starts2[lo:hi], patch_size)
+        correlations[lo:hi] = np.einsum('ik,ijk->ij', patches1, patches2)
+    return correlations
+
+def _window_correlations_worker(args):
+    """Process-pool worker: window_correlations_blocked on the shared data buffer"""
+    shm_name, shape, dtype, starts1, starts2, patch_size = args
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        data = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        correlations = window_correlations_blocked(data, starts1, starts2, patch_size)
+        del data  # Release the buffer before closing the mapping
+        return correlations
+    finally:
+        shm.close()
+
+def window_correlations(data, starts1, starts2, patch_size, n_workers=1):
+    """
+    Pearson r of each window data[starts1[i]:+patch_size] with its
+    partner windows data[starts2[i, j]:+patch_size]
+    Pairs involving a flat window get NaN, as np.corrcoef would give
+    Uses a parallel numba kernel when available; otherwise batched NumPy,
+    spread over n_workers processes when n_workers > 1 and the search is
+    large (see POOL_MIN_WINDOW_SAMPLES). n_workers only applies to that
+    fallback: the kernel runs on numba's own thread pool, sized by
+    NUMBA_NUM_THREADS
+    """
+    if numba is not None:
+        sums = _window_sums_numba(data, starts1, starts2, patch_size)
+        return pearson_from_sums(*sums, patch_size)
+    
+    n_workers = min(n_workers, len(starts1))
+    if n_workers <= 1 or starts2.size * patch_size < POOL_MIN_WINDOW_SAMPLES:
+        return window_correlations_blocked(data, starts1, starts2, patch_size)
+    
+    # Workers read the data from shared memory instead of a pickled copy
+    shm = shared_memory.SharedMemory(create=True, size=data.nbytes)
+    try:
+        shared = np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)
+        shared[:] = data
+        del shared
+        
+        chunks = np.array_split(np.arange(len(starts1)), n_workers)
+        tasks = [(shm.name, data.shape, data.dtype, starts1[chunk], starts2[chunk], patch_size)
+                 for chunk in chunks]
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            return np.concatenate(list(executor.map(_window_correlations_worker, tasks)))
+    finally:
+        shm.close()
+        shm.unlink()
+
+def match_records(matches):
+    """Convert rows of a MATCH_DTYPE table into plain dicts (e.g. for JSON)"""
+    return [dict(zip(MATCH_DTYPE.names, row)) for row in matches.tolist()]
+
+def finite_samples(cmb_data):
+    """
+    Drop invalid (NaN/inf) pixels once, as float32
+    float32 is ample for CMB temperatures and halves the memory traffic
+    of every later pass; the result is shared by the analyses and plots
+    """
+    valid_data = cmb_data[np.isfinite(cmb_data)].astype(np.float32, copy=False)
+    print(f"Valid data points: {len(valid_data)} of {len(cmb_data)}")
+    return valid_data
+
+def analyze_cmb_correlations(valid_data, patch_size=1000, n_samples=5000, min_correlation=0.1,
+                             n_workers=1):
     """
-    Analyze real CMB data for echo patterns
+    Analyze real CMB data (finite samples, see finite_samples) for echo patterns
+    Returns a MATCH_DTYPE table of the patch pairs above min_correlation
+    n_workers is the process count for large searches on the NumPy path
+    used without numba; the default runs serially
     """
     print(f"\n🔍 Analyzing CMB data for echo patterns...")
-    print(f"Data points: {len(cmb_data)}")
+    print(f"Data points: {len(valid_data)}")
     print(f"Patch size: {patch_size}")
     print(f"Sample points: {n_samples}")
     print(f"Min correlation: {min_correlation}")
     
-    # Remove any invalid data
-    valid_data = cmb_data[np.isfinite(cmb_data)]
-    print(f"Valid data points: {len(valid_data)}")
-    
     if len(valid_data) < patch_size * 2:
         print("❌ Not enough valid data for analysis")
-        return []
+        return np.empty(0, dtype=MATCH_DTYPE)
     
     # Statistics
     mean_temp = np.mean(valid_data)
@@ -105,67 +285,97 @@ def analyze_cmb_correlations(cmb_data, patch_size=1000, n_samples=5000, min_corr
     print(f"  Max:  {np.max(valid_data):.3e}")
     
     # Sample random locations for correlation analysis
-    np.random.seed(42)
+    rng = np.random.default_rng(42)
     max_start = len(valid_data) - patch_size
-    sample_starts = np.random.choice(max_start, min(n_samples, max_start), replace=False)
-    
-    matches = []
+    sample_starts = rng.choice(max_start, size=min(n_samples, max_start),
+                               replace=False, shuffle=False)
     
     print(f"\nSearching for correlations...")
     
-    for i, start1 in enumerate(sample_starts):
-        if i % 500 == 0:
-            print(f"  Progress: {i}/{len(sample_starts)} ({100*i/len(sample_starts):.1f}%)")
-        
-        # Extract first patch
-        patch1 = valid_data[start1:start1+patch_size]
-        
-        # Test different separations for potential echoes
-        test_separations = [
-            len(valid_data) // 4,   # Quarter way around
-            len(valid_data) // 2,   # Antipodal (opposite side)
-            3 * len(valid_data) // 4  # Three quarters
-        ]
-        
-        for separation in test_separations:
-            start2 = (start1 + separation) % len(valid_data)
-            
-            # Make sure we don't go past the end
-            if start2 + patch_size > len(valid_data):
-                start2 = len(valid_data) - patch_size
-            
-            patch2 = valid_data[start2:start2+patch_size]
-            
-            # Calculate correlation
-            try:
-                correlation = np.corrcoef(patch1, patch2)[0, 1]
-                
-                if not np.isnan(correlation) and abs(correlation) >= min_correlation:
-                    # Calculate angular separation (approximate)
-                    angular_sep = 360.0 * separation / len(valid_data)
-                    
-                    matches.append({
-                        'location1': int(start1),
-                        'location2': int(start2),
-                        'correlation': float(correlation),
-                        'separation_pixels': int(separation),
-                        'separation_degrees': float(angular_sep),
-                        'patch_size': patch_size
-                    })
-            except:
-                continue
+    n_valid = len(valid_data)
+    
+    # Test different separations for potential echoes
+    test_separations = np.array([
+        n_valid // 4,      # Quarter way around
+        n_valid // 2,      # Antipodal (opposite side)
+        3 * n_valid // 4   # Three quarters
+    ])
+    
+    # Partner patch for every (sample, separation) pair, kept inside the data
+    start2s = (sample_starts[:, None] + test_separations[None, :]) % n_valid
+    start2s = np.minimum(start2s, n_valid - patch_size)
+    
+    # Correlate each sampled patch with its partners in one batched pass;
+    # every patch is centred and scaled from its own values
+    correlations = window_correlations(valid_data, sample_starts, start2s, patch_size,
+                                       n_workers=n_workers)
+    
+    # Fill columns for the pairs above threshold only; no per-pair objects.
+    # Flat patches have no defined correlation and are dropped here
+    valid = np.isfinite(correlations) & (np.abs(correlations) >= min_correlation)
+    rows, cols = np.nonzero(valid)
+    
+    matches = np.empty(len(rows), dtype=MATCH_DTYPE)
+    matches['location1'] = sample_starts[rows]
+    matches['location2'] = start2s[rows, cols]
+    matches['correlation'] = correlations[rows, cols]
+    matches['separation_pixels'] = test_separations[cols]
+    # Angular separation (approximate)
+    matches['separation_degrees'] = 360.0 * test_separations[cols] / n_valid
+    matches['patch_size'] = patch_size
     
     print(f"\n✓ Analysis complete!")
     return matches
 
-def plot_cmb_analysis(cmb_data, matches, save_plots=True):
+def analyze_cmb_autocorrelation(valid_data, patch_size=1000, min_correlation=0.1, top_k=20):
+    """
+    Full-signal echo search: Pearson autocorrelation at every separation
+    Computed with a single FFT pass instead of sampled patch pairs
+    """
+    print(f"\n🔍 Computing full-signal autocorrelation...")
+    
+    n_valid = len(valid_data)
+    
+    if n_valid < patch_size * 2 + 1:
+        print("❌ Not enough valid data for analysis")
+        return []
+    
+    x = (valid_data - np.mean(valid_data)).astype(np.float32, copy=False)
+    
+    # Correlating x with its reverse gives sum_t x[t]*x[t+lag] for every lag;
+    # normalising by lag 0 turns that into the Pearson autocorrelation
+    acf = signal.fftconvolve(x, x[::-1], mode='full')[n_valid - 1:]
+    acf /= acf[0]
+    
+    # Only large separations can be echoes; pick the strongest local peaks
+    search = np.abs(acf[patch_size:n_valid - patch_size])
+    peaks, properties = signal.find_peaks(search, height=min_correlation)
+    strongest = np.argsort(properties['peak_heights'])[::-1][:top_k]
+    
+    echoes = []
+    for peak in peaks[strongest]:
+        lag = int(peak + patch_size)
+        echoes.append({
+            'separation_pixels': lag,
+            'separation_degrees': float(360.0 * lag / n_valid),
+            'correlation': float(acf[lag])
+        })
+    
+    print(f"✓ Found {len(peaks)} autocorrelation peaks above {min_correlation}")
+    for echo in echoes[:5]:
+        print(f"  r = {echo['correlation']:6.3f} at {echo['separation_degrees']:5.1f}° "
+              f"({echo['separation_pixels']} pixels)")
+    return echoes
+
+def plot_cmb_analysis(cmb_data, matches, save_plots=True, valid_data=None):
     """
     Create plots of CMB data and correlation results
+    Pass valid_data (finite samples) to avoid re-filtering cmb_data
     """
     print(f"\n📊 Creating analysis plots...")
     
     # Plot 1: CMB data overview
-    plt.figure(figsize=(15, 10))
+    fig = plt.figure(figsize=(15, 10))
     
     # Subsample for plotting (too many points otherwise)
     plot_data = cmb_data[::max(1, len(cmb_data)//10000)]
@@ -178,18 +388,24 @@ def plot_cmb_analysis(cmb_data, matches, save_plots=True):
     plt.grid(True, alpha=0.3)
     
     plt.subplot(2, 2, 2)
-    plt.hist(cmb_data[np.isfinite(cmb_data)], bins=100, alpha=0.7, edgecolor='black')
+    if valid_data is None:
+        valid_data = cmb_data[np.isfinite(cmb_data)]
+    counts, edges = np.histogram(valid_data, bins=100)
+    plt.bar(edges[:-1], counts, width=np.diff(edges), align='edge',
+            alpha=0.7, edgecolor='black')
     plt.title('CMB Temperature Distribution')
     plt.xlabel('Temperature')
     plt.ylabel('Count')
     plt.grid(True, alpha=0.3)
     
-    if matches:
-        correlations = [m['correlation'] for m in matches]
-        separations = [m['separation_degrees'] for m in matches]
+    if len(matches):
+        correlations = matches['correlation']
+        separations = matches['separation_degrees']
         
         plt.subplot(2, 2, 3)
-        plt.hist(correlations, bins=30, alpha=0.7, edgecolor='black', color='orange')
+        counts, edges = np.histogram(correlations, bins=30)
+        plt.bar(edges[:-1], counts, width=np.diff(edges), align='edge',
+                alpha=0.7, edgecolor='black', color='orange')
         plt.title(f'Echo Correlations Found ({len(matches)} matches)')
         plt.xlabel('Correlation Coefficient')
         plt.ylabel('Count')
@@ -198,19 +414,26 @@ def plot_cmb_analysis(cmb_data, matches, save_plots=True):
                    label=f'Mean: {np.mean(correlations):.3f}')
         plt.legend()
         
-        plt.subplot(2, 2, 4)
-        plt.scatter(separations, correlations, alpha=0.6, s=20)
+        if mpl_scatter_density is not None and len(matches) >= DENSITY_SCATTER_MIN_POINTS:
+            ax = fig.add_subplot(2, 2, 4, projection='scatter_density')
+            # Empty density cells fall below vmin and are left white
+            cmap = plt.get_cmap('viridis').copy()
+            cmap.set_under('white')
+            ax.scatter_density(separations, correlations, cmap=cmap, vmin=0.5)
+        else:
+            plt.subplot(2, 2, 4)
+            plt.scatter(separations, correlations, alpha=0.6, s=20, rasterized=True)
         plt.title('Correlation vs Angular Separation')
         plt.xlabel('Angular Separation (degrees)')
         plt.ylabel('Correlation Coefficient')
         plt.grid(True, alpha=0.3)
         
         # Highlight potential echo signatures
-        high_corr = [m for m in matches if abs(m['correlation']) > 0.2]
-        if high_corr:
-            high_sep = [m['separation_degrees'] for m in high_corr]
-            high_cor = [m['correlation'] for m in high_corr]
-            plt.scatter(high_sep, high_cor, color='red', s=40, alpha=0.8, 
+        high_corr = matches[np.abs(correlations) > 0.2]
+        if len(high_corr):
+            high_sep = high_corr['separation_degrees']
+            high_cor = high_corr['correlation']
+            plt.scatter(high_sep, high_cor, color='red', s=40, alpha=0.8, rasterized=True,
                        label=f'High correlation (n={len(high_corr)})')
             plt.legend()
     else:
@@ -227,13 +450,20 @@ def plot_cmb_analysis(cmb_data, matches, save_plots=True):
     plt.tight_layout()
     
     if save_plots:
-        plt.savefig('real_cmb_analysis.png', dpi=300, bbox_inches='tight')
+        save_figure(fig, 'real_cmb_analysis.png', dpi=300, bbox_inches='tight')
         print("📁 Saved plot: real_cmb_analysis.png")
     
-    plt.show()
+    if not HEADLESS:
+        plt.show()
+    plt.close(fig)
 
-def main():
-    """Main analysis of real CMB data"""
+def main(full_sweep=False):
+    """
+    Main analysis of real CMB data
+    full_sweep adds the FFT autocorrelation over every separation; on a
+    full-resolution map it takes several times longer than the sampled
+    search and a few GB of extra memory, so it is off by default
+    """
     print("🌌 Real CMB Data Analysis for Flat Loop Universe Theory")
     print("=" * 70)
     print("Analyzing actual Planck observations for cosmic echo patterns!")
@@ -258,36 +488,53 @@ def main():
         print("❌ Failed to read CMB data")
         return
     
+    # Filter invalid pixels once for the searches and the plots
+    valid_data = finite_samples(cmb_data)
+    
     # Analyze for echo patterns
     matches = analyze_cmb_correlations(
-        cmb_data, 
+        valid_data,
         patch_size=2000,    # Larger patches for real data
         n_samples=3000,     # More samples for thorough search
         min_correlation=0.1  # Lower threshold for real data
     )
     
+    # Optional full-signal sweep over every separation, not just the sampled ones
+    autocorrelation_peaks = None
+    if full_sweep:
+        autocorrelation_peaks = analyze_cmb_autocorrelation(
+            valid_data,
+            patch_size=2000,
+            min_correlation=0.1
+        )
+    
     # Results
     print(f"\n🎯 ANALYSIS RESULTS:")
     print(f"{'='*50}")
     
-    if matches:
+    if len(matches):
         print(f"✓ Found {len(matches)} potential echo patterns!")
         
-        # Sort by correlation strength
-        matches.sort(key=lambda x: abs(x['correlation']), reverse=True)
+        # Strongest 20 by |correlation|: partition in O(N), then sort only
+        # those rows; only they become dicts
+        abs_correlations = np.abs(matches['correlation'])
+        k = min(20, len(matches))
+        top = np.argpartition(-abs_correlations, k - 1)[:k]
+        top = top[np.argsort(-abs_correlations[top], kind='stable')]
+        top_matches = match_records(matches[top])
         
         print(f"\n🏆 Top 10 Echo Candidates:")
         print("Rank | Correlation | Angular Sep | Pixel Locations")
         print("-" * 55)
         
-        for i, match in enumerate(matches[:10]):
+        for i, match in enumerate(top_matches[:10]):
             print(f"{i+1:4d} | {match['correlation']:10.3f} | "
                   f"{match['separation_degrees']:9.1f}° | "
                   f"{match['location1']:6d}-{match['location2']:6d}")
         
         # Statistical analysis
-        correlations = [m['correlation'] for m in matches]
-        strong_matches = [m for m in matches if abs(m['correlation']) > 0.2]
+        correlations = matches['correlation']
+        strong_matches = matches[np.abs(correlations) > 0.2]
         
         print(f"\n📊 Statistical Summary:")
         print(f"  Total matches: {len(matches)}")
@@ -295,15 +542,15 @@ def main():
         print(f"  Mean correlation: {np.mean(correlations):.3f}")
         print(f"  Max correlation: {np.max(np.abs(correlations)):.3f}")
         
-        if strong_matches:
+        if len(strong_matches):
             print(f"\n🌀 POTENTIAL FLAT LOOP UNIVERSE EVIDENCE:")
             print(f"  Found {len(strong_matches)} strong echo candidates!")
             print(f"  This could indicate toroidal topology!")
             
             # Check for specific separations expected in toroidal universe
-            separations = [m['separation_degrees'] for m in strong_matches]
-            near_90 = sum(1 for s in separations if 85 <= s <= 95)
-            near_180 = sum(1 for s in separations if 175 <= s <= 185)
+            separations = strong_matches['separation_degrees']
+            near_90, near_180 = np.count_nonzero(
+                np.abs(separations - np.array([[90.0], [180.0]])) <= 5, axis=1).tolist()
             
             print(f"  Near 90° separations: {near_90}")
             print(f"  Near 180° separations: {near_180}")
@@ -320,11 +567,17 @@ def main():
             'strong_matches': len(strong_matches),
             'max_correlation': float(np.max(np.abs(correlations))),
             'mean_correlation': float(np.mean(correlations)),
-            'top_matches': matches[:20]
+            'top_matches': top_matches
         }
+        if autocorrelation_peaks is not None:
+            results['autocorrelation_peaks'] = autocorrelation_peaks
         
-        with open('real_cmb_results.json', 'w') as f:
-            json.dump(results, f, indent=2)
+        if orjson is not None:
+            with open('real_cmb_results.json', 'wb') as f:
+                f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+        else:
+            with open('real_cmb_results.json', 'w') as f:
+                json.dump(results, f, indent=2)
         
         print(f"\n💾 Results saved to: real_cmb_results.json")
         
@@ -336,17 +589,17 @@ def main():
         print("  3. Need different analysis parameters")
     
     # Create visualization
-    plot_cmb_analysis(cmb_data, matches)
+    plot_cmb_analysis(cmb_data, matches, valid_data=valid_data)
     
     print(f"\n{'='*70}")
     print("🔬 REAL CMB ANALYSIS COMPLETE!")
     print("You have now tested the Flat Loop Universe theory")
     print("against actual cosmic microwave background observations!")
     
-    if matches:
+    if len(matches):
         print(f"🎉 DISCOVERY: Found {len(matches)} potential cosmic echoes!")
     else:
         print("📊 No strong evidence for cosmic echoes detected")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(full_sweep='--full-sweep' in sys.argv)
\ No newline at end of file
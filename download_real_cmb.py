@@ -4,30 +4,174 @@ Download Real CMB Data from Planck Mission
 For testing the Flat Loop Universe theory with actual observations
 """
 
-import urllib.request
 import os
 from pathlib import Path
 import gzip
 import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-def download_file(url, filename, description=""):
-    """Download a file with progress indication"""
-    print(f"Downloading {description}...")
-    print(f"URL: {url}")
-    print(f"Saving to: {filename}")
+# ~100 KiB reads keep syscalls and Python overhead per MB low
+CHUNK_SIZE = 1 << 17
+# Print progress every PROGRESS_EVERY chunks (~8 MB) rather than every block
+PROGRESS_EVERY = 64
+# Buffer for in-process gunzip copies; 1 MiB instead of copyfileobj's default
+COPY_BUFFER_SIZE = 1 << 20
+
+# Downloads run in parallel threads; keep their messages from interleaving
+print_lock = threading.Lock()
+
+def make_session():
+    """
+    One HTTP session shared by all downloads, so connections to each host
+    are kept alive and reused; transient server errors are retried
+    """
+    session = requests.Session()
+    # FITS maps are already compact; don't let a server gzip them on the fly
+    session.headers["Accept-Encoding"] = "identity"
     
-    def progress_hook(block_num, block_size, total_size):
-        if total_size > 0:
-            percent = min(100, (block_num * block_size * 100) // total_size)
-            print(f"\rProgress: {percent}% ({block_num * block_size // (1024*1024)} MB)", end="")
+    retries = Retry(total=3, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=retries)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def is_up_to_date(session, url, filename):
+    """
+    True if filename already matches the remote file, judged from one HEAD
+    request: same Content-Length and, when both are known, the same ETag
+    """
+    if not os.path.exists(filename):
+        return False
     
     try:
-        urllib.request.urlretrieve(url, filename, progress_hook)
-        print(f"\n✓ Downloaded successfully!")
-        return True
-    except Exception as e:
-        print(f"\n✗ Download failed: {e}")
+        head = session.head(url, allow_redirects=True, timeout=30)
+        head.raise_for_status()
+    except requests.RequestException:
+        return False
+    
+    if os.path.getsize(filename) != int(head.headers.get("Content-Length", -1)):
         return False
+    
+    etag = head.headers.get("ETag")
+    etag_file = Path(filename + ".etag")
+    if etag and etag_file.exists():
+        return etag_file.read_text() == etag
+    return True
+
+def download_file(session, url, filename, description=""):
+    """
+    Download a file with progress indication, streaming it to disk in large chunks
+    Returns (filename, success) so it can run as a thread-pool task
+    """
+    with print_lock:
+        print(f"\n{'-'*40}")
+        print(f"Downloading {description}...")
+        print(f"URL: {url}")
+        print(f"Saving to: {filename}")
+    
+    if is_up_to_date(session, url, filename):
+        with print_lock:
+            print(f"✓ {description} already downloaded (cached)")
+        return filename, True
+    
+    # Bytes land in a .part file first; an interrupted download resumes
+    # from where it stopped with an HTTP Range request. The ETag of the
+    # partial file goes in If-Range, so a file that changed on the server
+    # since is sent whole instead of being appended to the old bytes
+    part_filename = filename + ".part"
+    part_etag_filename = part_filename + ".etag"
+    part_etag = None
+    if os.path.exists(part_filename) and os.path.exists(part_etag_filename):
+        part_etag = Path(part_etag_filename).read_text()
+    resume_from = os.path.getsize(part_filename) if part_etag else 0
+    headers = {"Range": f"bytes={resume_from}-", "If-Range": part_etag} if resume_from else {}
+    
+    try:
+        with session.get(url, headers=headers, stream=True, timeout=30) as response:
+            if response.status_code == 416:
+                # Nothing past resume_from; the partial file is complete
+                # only if that is the whole remote length
+                remote_size = response.headers.get("Content-Range", "").rpartition("/")[2]
+                if remote_size != str(resume_from):
+                    os.remove(part_filename)
+                    os.remove(part_etag_filename)
+                    with print_lock:
+                        print(f"  Partial {os.path.basename(filename)} does not match the server, starting over")
+                    return download_file(session, url, filename, description)
+                os.replace(part_filename, filename)
+                os.replace(part_etag_filename, filename + ".etag")
+                with print_lock:
+                    print(f"✓ Downloaded {description} successfully!")
+                return filename, True
+            response.raise_for_status()
+            etag = response.headers.get("ETag")
+            
+            # 206 means the server honoured the Range; otherwise start over
+            if response.status_code == 206:
+                with print_lock:
+                    print(f"  Resuming {os.path.basename(filename)} at {resume_from // (1024*1024)} MB")
+                downloaded, mode = resume_from, "ab"
+            else:
+                downloaded, mode = 0, "wb"
+                # Only a strong ETag can validate a later resume
+                if etag and not etag.startswith("W/"):
+                    Path(part_etag_filename).write_text(etag)
+                elif os.path.exists(part_etag_filename):
+                    os.remove(part_etag_filename)
+            content_length = response.headers.get("Content-Length")
+            total_size = downloaded + int(content_length or 0)
+            
+            with open(part_filename, mode) as f:
+                for chunk_num, chunk in enumerate(response.iter_content(chunk_size=CHUNK_SIZE), 1):
+                    f.write(chunk)
+                    downloaded += len(chunk)
+                    if chunk_num % PROGRESS_EVERY == 0 and total_size > 0:
+                        percent = min(100, downloaded * 100 // total_size)
+                        with print_lock:
+                            print(f"  {os.path.basename(filename)}: {percent}% "
+                                  f"({downloaded // (1024*1024)} MB)")
+        
+        # A cut-off transfer stays in the .part file, to be resumed next time
+        if content_length is not None and downloaded != total_size:
+            raise IOError(f"connection closed after {downloaded} of {total_size} bytes")
+        os.replace(part_filename, filename)
+        if os.path.exists(part_etag_filename):
+            os.remove(part_etag_filename)
+        if etag:
+            Path(filename + ".etag").write_text(etag)
+        with print_lock:
+            print(f"✓ Downloaded {description} successfully!")
+        return filename, True
+    except Exception as e:
+        with print_lock:
+            print(f"✗ Download of {description} failed: {e}")
+        return filename, False
+
+def decompress_gzip(path):
+    """
+    Extract path (ending in .gz) next to itself and remove the archive
+    Uses igzip or pigz when installed, which decode much faster than zlib
+    """
+    output_path = path[:-3]
+    
+    for tool in ("igzip", "pigz"):
+        if shutil.which(tool):
+            with open(output_path, 'wb') as f_out:
+                result = subprocess.run([tool, "-dc", path], stdout=f_out)
+            if result.returncode == 0:
+                break
+    else:
+        with gzip.open(path, 'rb') as f_in:
+            with open(output_path, 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out, length=COPY_BUFFER_SIZE)
+    
+    os.remove(path)
+    return output_path
 
 def download_planck_cmb_data():
     """Download real Planck CMB temperature maps"""
@@ -68,45 +212,53 @@ def download_planck_cmb_data():
         }
     ]
     
+    # One flat list, numbered as shown in the menu
+    all_files = [*cmb_files, *backup_files]
+    
     print("Available real CMB datasets:")
-    for i, file_info in enumerate(cmb_files + backup_files):
+    for i, file_info in enumerate(all_files):
         print(f"{i+1}. {file_info['description']} ({file_info['size']})")
     
     print()
-    choice = input("Which dataset would you like to download? (1-3, or 'all'): ").strip().lower()
+    choice = input(f"Which dataset would you like to download? (1-{len(all_files)}, or 'all'): ").strip().lower()
     
-    if choice == 'all':
-        files_to_download = cmb_files + backup_files
-    else:
-        try:
-            idx = int(choice) - 1
-            files_to_download = [cmb_files[idx]] if idx < len(cmb_files) else [backup_files[idx - len(cmb_files)]]
-        except:
-            print("Invalid choice, downloading first dataset...")
-            files_to_download = [cmb_files[0]]
+    try:
+        if choice == 'all':
+            files_to_download = all_files
+        elif 1 <= int(choice) <= len(all_files):
+            files_to_download = [all_files[int(choice) - 1]]
+        else:
+            raise ValueError(choice)
+    except ValueError:
+        print("Invalid choice, downloading first dataset...")
+        files_to_download = [all_files[0]]
     
-    # Download selected files
-    successful_downloads = []
+    # Download selected files; saved path per future, once it succeeds
+    saved_files = {}
     
-    for file_info in files_to_download:
-        print(f"\n{'-'*40}")
-        success = download_file(
-            file_info["url"], 
-            file_info["filename"], 
-            file_info["description"]
-        )
+    # Files come from independent servers, so fetch them concurrently
+    with make_session() as session, \
+            ThreadPoolExecutor(max_workers=len(files_to_download)) as executor:
+        futures = [
+            executor.submit(download_file, session,
+                            file_info["url"], file_info["filename"], file_info["description"])
+            for file_info in files_to_download
+        ]
         
-        if success:
-            successful_downloads.append(file_info["filename"])
+        # Extract each file as soon as its download finishes
+        for future in as_completed(futures):
+            filename, success = future.result()
             
-            # Check if file is gzipped and extract
-            if file_info["filename"].endswith('.gz'):
-                print("Extracting gzipped file...")
-                with gzip.open(file_info["filename"], 'rb') as f_in:
-                    with open(file_info["filename"][:-3], 'wb') as f_out:
-                        shutil.copyfileobj(f_in, f_out)
-                os.remove(file_info["filename"])
-                successful_downloads[-1] = file_info["filename"][:-3]
+            if success:
+                # Check if file is gzipped and extract
+                if filename.endswith('.gz'):
+                    with print_lock:
+                        print("Extracting gzipped file...")
+                    filename = decompress_gzip(filename)
+                saved_files[future] = filename
+    
+    # Report in the order requested, so the CMB map comes before the masks
+    successful_downloads = [saved_files[future] for future in futures if future in saved_files]
     
     print(f"\n{'='*60}")
     print("🎉 Download Summary:")
@@ -8,27 +8,31 @@ import sys
 import subprocess
 import platform
 import os
+import shlex
+import shutil
+import functools
+from dataclasses import dataclass
 from pathlib import Path
 
 def run_command(cmd, description=""):
-    """Run a command and handle errors"""
-    print(f"Running: {cmd}")
+    """
+    Run a command (argument list, no shell) and handle errors
+    Its output streams straight to the terminal instead of being buffered
+    """
+    print(f"Running: {shlex.join(cmd)}")
     if description:
         print(f"  {description}")
+    sys.stdout.flush()  # Keep our messages ahead of the child's output
     
     try:
-        result = subprocess.run(cmd, shell=True, check=True, 
-                              capture_output=True, text=True)
+        subprocess.run(cmd, check=True)
         print(f"  ✓ Success")
         return True
-    except subprocess.CalledProcessError as e:
+    except (subprocess.CalledProcessError, OSError) as e:
         print(f"  ✗ Failed: {e}")
-        if e.stdout:
-            print(f"  stdout: {e.stdout}")
-        if e.stderr:
-            print(f"  stderr: {e.stderr}")
         return False
 
+@functools.lru_cache(maxsize=1)
 def check_python_version():
     """Check if Python version is compatible"""
     version = sys.version_info
@@ -41,26 +45,36 @@ def check_python_version():
     print("✓ Python version compatible")
     return True
 
+@dataclass(frozen=True)
+class PlatformInfo:
+    """Operating system and architecture, as found by detect_platform"""
+    system: str
+    machine: str
+    is_windows: bool
+    is_macos: bool
+    is_linux: bool
+    is_arm: bool
+
+@functools.lru_cache(maxsize=1)
 def detect_platform():
-    """Detect the operating system and architecture"""
+    """Detect the operating system and architecture (probed once per run)"""
     system = platform.system().lower()
     machine = platform.machine().lower()
     
     print(f"Platform: {system} {machine}")
     
-    platform_info = {
-        'system': system,
-        'machine': machine,
-        'is_windows': system == 'windows',
-        'is_macos': system == 'darwin',
-        'is_linux': system == 'linux',
-        'is_arm': 'arm' in machine or 'aarch64' in machine
-    }
-    
-    return platform_info
+    return PlatformInfo(
+        system=system,
+        machine=machine,
+        is_windows=system == 'windows',
+        is_macos=system == 'darwin',
+        is_linux=system == 'linux',
+        is_arm='arm' in machine or 'aarch64' in machine
+    )
 
+@functools.lru_cache(maxsize=1)
 def check_conda_available():
-    """Check if conda is available"""
+    """Check if conda is available (runs conda --version once per run)"""
     try:
         result = subprocess.run(['conda', '--version'], 
                               capture_output=True, text=True)
@@ -73,24 +87,22 @@ def check_conda_available():
     print("ℹ Conda not available")
     return False
 
+def conda_executable():
+    """mamba when installed (a much faster solver), otherwise conda"""
+    return "mamba" if shutil.which("mamba") else "conda"
+
 def install_with_conda():
     """Install packages using conda"""
     print("\n🔧 Installing with conda...")
     
     packages = [
-        "numpy", "scipy", "matplotlib", "pandas", "jupyter",
+        "healpy", "numpy", "scipy", "matplotlib", "pandas", "jupyter",
         "astropy", "scikit-image", "seaborn", "tqdm", "numba"
     ]
     
-    # Install healpy separately from conda-forge
-    if not run_command("conda install -c conda-forge healpy -y", 
-                      "Installing healpy from conda-forge"):
-        return False
-    
-    # Install other packages
-    package_str = " ".join(packages)
-    if not run_command(f"conda install {package_str} -y", 
-                      "Installing other packages"):
+    # One solve for everything, with healpy from conda-forge
+    if not run_command([conda_executable(), "install", "-c", "conda-forge", *packages, "-y", "--quiet"],
+                      "Installing healpy and other packages from conda-forge"):
         return False
     
     return True
@@ -99,18 +111,19 @@ def install_system_dependencies_linux():
     """Install system dependencies on Linux"""
     print("\n🔧 Installing Linux system dependencies...")
     
-    # Try different package managers
+    # Try different package managers; each entry is a sequence of commands
     commands = [
         # Ubuntu/Debian
-        "sudo apt-get update && sudo apt-get install -y build-essential gfortran libcfitsio-dev pkg-config",
+        [["sudo", "apt-get", "update"],
+         ["sudo", "apt-get", "install", "-y", "build-essential", "gfortran", "libcfitsio-dev", "pkg-config"]],
         # CentOS/RHEL (older)
-        "sudo yum install -y gcc-gfortran cfitsio-devel pkgconfig",
+        [["sudo", "yum", "install", "-y", "gcc-gfortran", "cfitsio-devel", "pkgconfig"]],
         # Fedora/CentOS (newer)
-        "sudo dnf install -y gcc-gfortran cfitsio-devel pkgconfig"
+        [["sudo", "dnf", "install", "-y", "gcc-gfortran", "cfitsio-devel", "pkgconfig"]]
     ]
     
-    for cmd in commands:
-        if run_command(cmd, "Installing system dependencies"):
+    for steps in commands:
+        if all(run_command(cmd, "Installing system dependencies") for cmd in steps):
             return True
     
     print("⚠ Could not install system dependencies automatically")
@@ -126,15 +139,15 @@ def install_system_dependencies_macos():
     print("\n🔧 Installing macOS system dependencies...")
     
     # Check for Xcode command line tools
-    if not run_command("xcode-select -p", "Checking Xcode tools"):
+    if not run_command(["xcode-select", "-p"], "Checking Xcode tools"):
         print("Installing Xcode command line tools...")
-        if not run_command("xcode-select --install", "Installing Xcode tools"):
+        if not run_command(["xcode-select", "--install"], "Installing Xcode tools"):
             print("⚠ Please install Xcode command line tools manually")
             return False
     
     # Try to install cfitsio with Homebrew
-    if run_command("brew --version", "Checking Homebrew"):
-        run_command("brew install cfitsio", "Installing cfitsio")
+    if run_command(["brew", "--version"], "Checking Homebrew"):
+        run_command(["brew", "install", "cfitsio"], "Installing cfitsio")
     
     return True
 
@@ -143,43 +156,41 @@ def install_with_pip(platform_info):
     print("\n🔧 Installing with pip...")
     
     # Install system dependencies first
-    if platform_info['is_linux']:
+    if platform_info.is_linux:
         install_system_dependencies_linux()
-    elif platform_info['is_macos']:
+    elif platform_info.is_macos:
         install_system_dependencies_macos()
     
     # Upgrade pip first
-    run_command(f"{sys.executable} -m pip install --upgrade pip", 
+    run_command([sys.executable, "-m", "pip", "install", "--upgrade", "pip"],
                 "Upgrading pip")
     
-    # Try different healpy installation methods
-    healpy_methods = [
-        # Method 1: Try pre-compiled wheel
-        f"{sys.executable} -m pip install --only-binary=healpy healpy",
-        # Method 2: Standard installation
-        f"{sys.executable} -m pip install healpy",
-        # Method 3: No cache (sometimes helps)
-        f"{sys.executable} -m pip install --no-cache-dir healpy",
-        # Method 4: Force reinstall
-        f"{sys.executable} -m pip install --force-reinstall healpy"
-    ]
+    # healpy goes in with the other requirements so one resolver pass sees
+    # all the pins; prefer wheels, and build healpy from source only if that fails
+    pip_install = [sys.executable, "-m", "pip", "install", "--no-input", "--prefer-binary", "-U"]
+    requirements = ["-r", "requirements.txt"] if Path("requirements.txt").exists() else []
     
+    print(f"\nTrying healpy installation method...")
+    if run_command([*pip_install, "healpy", *requirements], "Installing healpy and requirements"):
+        return True
+    
+    # pip installs all or nothing, so find out which part failed: healpy
+    # wheels on their own, or else healpy built from source
     healpy_installed = False
-    for method in healpy_methods:
-        print(f"\nTrying healpy installation method...")
-        if run_command(method, "Installing healpy"):
-            healpy_installed = True
-            break
+    if requirements:
+        print("Method failed, trying healpy on its own...")
+        healpy_installed = run_command([*pip_install, "healpy"], "Installing healpy (wheels)")
+    if not healpy_installed:
         print("Method failed, trying next...")
-    
+        healpy_installed = run_command([*pip_install, "--no-binary=healpy", "healpy"],
+                                       "Building healpy from source")
     if not healpy_installed:
         print("❌ All healpy installation methods failed")
         return False
     
-    # Install other requirements
-    if not run_command(f"{sys.executable} -m pip install -r requirements.txt", 
-                      "Installing other requirements"):
-        print("⚠ Some packages may have failed to install")
+    # healpy is in; a requirements failure is only a warning, as before
+    if requirements and not run_command([*pip_install, *requirements], "Installing requirements"):
+        print("⚠ Some packages from requirements.txt failed to install (see pip output above)")
     
     return True
 
@@ -190,18 +201,21 @@ def create_conda_environment():
     env_name = "loopscan"
     
     # Remove existing environment if it exists
-    run_command(f"conda env remove -n {env_name} -y", 
+    run_command(["conda", "env", "remove", "-n", env_name, "-y"],
                 "Removing existing environment")
     
     # Create new environment
-    if not run_command(f"conda create -n {env_name} python=3.9 -y", 
+    if not run_command(["conda", "create", "-n", env_name, "python=3.9", "-y", "--quiet"],
                       "Creating new environment"):
         return False
     
-    # Activate and install packages
-    activate_cmd = f"conda activate {env_name} && "
-    
-    if not run_command(f"{activate_cmd}conda install -c conda-forge healpy numpy scipy matplotlib astropy scikit-image pandas jupyter seaborn tqdm numba -y", 
+    # Install packages into the environment; -n targets it without a shell
+    # to activate it in
+    packages = [
+        "healpy", "numpy", "scipy", "matplotlib", "astropy", "scikit-image",
+        "pandas", "jupyter", "seaborn", "tqdm", "numba"
+    ]
+    if not run_command([conda_executable(), "install", "-n", env_name, "-c", "conda-forge", *packages, "-y", "--quiet"],
                       "Installing packages in environment"):
         return False
     
@@ -217,7 +231,7 @@ def test_installation():
     
     # Run the test script
     if Path("test_healpy.py").exists():
-        return run_command(f"{sys.executable} test_healpy.py", 
+        return run_command([sys.executable, "test_healpy.py"],
                           "Running installation tests")
     else:
         # Quick inline test
@@ -6,18 +6,26 @@ Main CLI interface for the Flat Loop Universe analysis tool
 
 import argparse
 import logging
+import math
 import sys
 from pathlib import Path
 import json
-import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # Optional: falls back to the stdlib json module
 
 # Add src to path
-sys.path.append('src')
+if 'src' not in sys.path:
+    sys.path.append('src')
+
+# numpy and the src/ modules (healpy, matplotlib, astropy) are imported
+# inside the run_* functions, so --help and argument errors return at once
 
-from data_loader import CMBDataLoader
-from echo_detector import EchoDetector
-from visualizer import CMBVisualizer
-from synthetic_data import SyntheticCMBGenerator
+def degrees(value):
+    """argparse type: an angle given in degrees, stored in radians"""
+    return math.radians(float(value))
 
 def setup_logging(verbose: bool = False):
     """Configure logging"""
@@ -27,8 +35,77 @@ def setup_logging(verbose: bool = False):
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     )
 
+def has_monopole_dipole(cmb_map, rel_tolerance=1e-6):
+    """
+    False if the map's monopole and dipole are already ~zero
+    A single least-squares fit over the pixels (no harmonic transform)
+    """
+    import numpy as np
+    import healpy as hp
+    
+    monopole, dipole = hp.fit_dipole(cmb_map)
+    
+    valid = cmb_map[cmb_map != hp.UNSEEN]
+    scale = np.std(valid) if len(valid) else 0.0
+    return max(abs(monopole), np.max(np.abs(dipole))) > rel_tolerance * scale
+
+def sort_by_correlation(matches):
+    """Matches ordered by |correlation|, strongest first (one C-level argsort)"""
+    import numpy as np
+    
+    scores = np.fromiter((abs(m.correlation_score) for m in matches),
+                         dtype=np.float64, count=len(matches))
+    return [matches[i] for i in np.argsort(-scores, kind='stable')]
+
+def match_records(matches):
+    """
+    JSON-ready dicts for a list of matches, angles in degrees
+    Angles are converted with one np.degrees call per field, not per match
+    """
+    import numpy as np
+    
+    if not matches:
+        return []
+    
+    centers1 = np.degrees(np.array([m.region1_center for m in matches], dtype=np.float64)[:, :2])
+    centers2 = np.degrees(np.array([m.region2_center for m in matches], dtype=np.float64)[:, :2])
+    separations = np.degrees(np.array([m.angular_separation for m in matches], dtype=np.float64))
+    scores = np.array([m.correlation_score for m in matches], dtype=np.float64)
+    
+    return [
+        {
+            'region1_center_deg': center1,
+            'region2_center_deg': center2,
+            'angular_separation_deg': separation,
+            'correlation_score': score,
+            'method': match.method
+        }
+        for match, center1, center2, separation, score
+        in zip(matches, centers1.tolist(), centers2.tolist(), separations.tolist(), scores.tolist())
+    ]
+
+def save_results(results, output_path):
+    """
+    Write results as indented JSON, with orjson when available
+    Serialised in memory and written with one call to a temporary file that
+    then replaces output_path, so a crash never leaves truncated JSON
+    """
+    if orjson is not None:
+        blob = orjson.dumps(results, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+    else:
+        blob = json.dumps(results, indent=2).encode('utf-8')
+    
+    tmp_path = Path(f"{output_path}.tmp")
+    tmp_path.write_bytes(blob)
+    tmp_path.replace(output_path)
+
 def run_synthetic_test(args):
     """Run synthetic data test"""
+    import numpy as np
+    from echo_detector import EchoDetector
+    from visualizer import CMBVisualizer
+    from synthetic_data import SyntheticCMBGenerator
+    
     print("🌀 LoopScan: Synthetic Echo Detection Test")
     print("=" * 50)
     
@@ -45,20 +122,23 @@ def run_synthetic_test(args):
     # Run detection
     detector = EchoDetector(nside=args.nside)
     
+    # Angles arrive in radians from argparse
+    patch_radius = args.patch_radius
+    shift_angles = np.asarray(args.shift_angles, dtype=np.float64)
+    
     # Antipodal search
     antipodal_matches = detector.detect_antipodal_echoes(
         synthetic_map,
-        patch_radius=np.radians(args.patch_size),
+        patch_radius=patch_radius,
         min_correlation=args.min_corr,
         n_samples=args.n_samples
     )
     
     # Toroidal search
-    shift_angles = [np.radians(angle) for angle in args.shift_angles]
     toroidal_matches = detector.detect_toroidal_echoes(
         synthetic_map,
         shift_angles=shift_angles,
-        patch_radius=np.radians(args.patch_size),
+        patch_radius=patch_radius,
         min_correlation=args.min_corr,
         n_samples=args.n_samples // 2
     )
@@ -72,7 +152,7 @@ def run_synthetic_test(args):
     
     if all_matches:
         # Sort by correlation
-        all_matches.sort(key=lambda x: abs(x.correlation_score), reverse=True)
+        all_matches = sort_by_correlation(all_matches)
         
         print(f"\nTop 5 Detections:")
         for i, match in enumerate(all_matches[:5]):
@@ -98,31 +178,24 @@ def run_synthetic_test(args):
             'n_matches_found': len(all_matches),
             'detection_parameters': {
                 'nside': args.nside,
-                'patch_size_deg': args.patch_size,
+                'patch_size_deg': round(math.degrees(args.patch_radius), 10),
                 'min_correlation': args.min_corr,
                 'n_samples': args.n_samples
             },
-            'matches': []
+            'matches': match_records(all_matches)
         }
         
-        for match in all_matches:
-            results['matches'].append({
-                'region1_center_deg': [np.degrees(match.region1_center[0]), 
-                                     np.degrees(match.region1_center[1])],
-                'region2_center_deg': [np.degrees(match.region2_center[0]), 
-                                     np.degrees(match.region2_center[1])],
-                'angular_separation_deg': np.degrees(match.angular_separation),
-                'correlation_score': match.correlation_score,
-                'method': match.method
-            })
-        
-        with open(args.output, 'w') as f:
-            json.dump(results, f, indent=2)
+        save_results(results, args.output)
         
         print(f"\nResults saved to {args.output}")
 
 def run_real_data_analysis(args):
     """Run analysis on real CMB data"""
+    import numpy as np
+    from data_loader import CMBDataLoader
+    from echo_detector import EchoDetector
+    from visualizer import CMBVisualizer
+    
     print("🌀 LoopScan: Real CMB Data Analysis")
     print("=" * 50)
     
@@ -133,33 +206,41 @@ def run_real_data_analysis(args):
         cmb_map = loader.load_planck_map(args.data_file)
         print(f"Loaded CMB map: {loader.get_map_statistics(cmb_map)}")
         
-        # Downsample if requested
+        # Downsample if requested; both searches below run at this resolution
         import healpy as hp
         if args.nside < hp.npix2nside(len(cmb_map)):
             cmb_map = loader.downsample_map(cmb_map, args.nside)
+        map_nside = hp.npix2nside(len(cmb_map))
+        assert map_nside <= args.nside
         
-        # Clean map
-        cmb_map = loader.remove_monopole_dipole(cmb_map)
+        # Clean map, unless an already-cleaned map is being re-analysed
+        if has_monopole_dipole(cmb_map):
+            cmb_map = loader.remove_monopole_dipole(cmb_map)
+        else:
+            print("Monopole and dipole already removed, skipping cleaning")
         
-        # Run detection
-        detector = EchoDetector(nside=args.nside)
+        # Run detection; one detector, sized to the map, serves both searches
+        detector = EchoDetector(nside=map_nside)
         
         print("Searching for echo patterns...")
         
+        # Patch radius arrives in radians from argparse
+        patch_radius = args.patch_radius
+        shift_angles = np.radians(np.array([90.0, 180.0, 120.0]))
+        
         # Antipodal search
         antipodal_matches = detector.detect_antipodal_echoes(
             cmb_map,
-            patch_radius=np.radians(args.patch_size),
+            patch_radius=patch_radius,
             min_correlation=args.min_corr,
             n_samples=args.n_samples
         )
         
         # Toroidal search
-        shift_angles = [np.radians(90), np.radians(180), np.radians(120)]
         toroidal_matches = detector.detect_toroidal_echoes(
             cmb_map,
             shift_angles=shift_angles,
-            patch_radius=np.radians(args.patch_size),
+            patch_radius=patch_radius,
             min_correlation=args.min_corr,
             n_samples=args.n_samples // 2
         )
@@ -172,7 +253,7 @@ def run_real_data_analysis(args):
         print(f"  Total matches: {len(all_matches)}")
         
         if all_matches:
-            all_matches.sort(key=lambda x: abs(x.correlation_score), reverse=True)
+            all_matches = sort_by_correlation(all_matches)
             print(f"\nTop 5 Detections:")
             for i, match in enumerate(all_matches[:5]):
                 print(f"  {i+1}. Correlation: {match.correlation_score:.3f}, "
@@ -197,26 +278,14 @@ def run_real_data_analysis(args):
                 'n_matches_found': len(all_matches),
                 'detection_parameters': {
                     'nside': args.nside,
-                    'patch_size_deg': args.patch_size,
+                    'patch_size_deg': round(math.degrees(args.patch_radius), 10),
                     'min_correlation': args.min_corr,
                     'n_samples': args.n_samples
                 },
-                'matches': []
+                'matches': match_records(all_matches)
             }
             
-            for match in all_matches:
-                results['matches'].append({
-                    'region1_center_deg': [np.degrees(match.region1_center[0]), 
-                                         np.degrees(match.region1_center[1])],
-                    'region2_center_deg': [np.degrees(match.region2_center[0]), 
-                                         np.degrees(match.region2_center[1])],
-                    'angular_separation_deg': np.degrees(match.angular_separation),
-                    'correlation_score': match.correlation_score,
-                    'method': match.method
-                })
-            
-            with open(args.output, 'w') as f:
-                json.dump(results, f, indent=2)
+            save_results(results, args.output)
             
             print(f"\nResults saved to {args.output}")
         
@@ -257,14 +326,14 @@ Examples:
                                 help='Number of echo pairs to plant')
     synthetic_parser.add_argument('--strength', type=float, default=100.0,
                                 help='Echo pattern strength (μK)')
-    synthetic_parser.add_argument('--patch-size', type=float, default=10.0,
-                                help='Patch radius in degrees')
+    synthetic_parser.add_argument('--patch-size', type=degrees, default=math.radians(10.0),
+                                dest='patch_radius', help='Patch radius in degrees')
     synthetic_parser.add_argument('--min-corr', type=float, default=0.2,
                                 help='Minimum correlation threshold')
     synthetic_parser.add_argument('--n-samples', type=int, default=2000,
                                 help='Number of sample points')
-    synthetic_parser.add_argument('--shift-angles', nargs='+', type=float,
-                                default=[90.0, 180.0, 120.0],
+    synthetic_parser.add_argument('--shift-angles', nargs='+', type=degrees,
+                                default=[math.radians(a) for a in (90.0, 180.0, 120.0)],
                                 help='Angular shifts to test (degrees)')
     synthetic_parser.add_argument('--plot', action='store_true',
                                 help='Generate visualization plots')
@@ -277,8 +346,8 @@ Examples:
                            help='CMB .fits file in data/ directory')
     real_parser.add_argument('--nside', type=int, default=512,
                            help='Target resolution (will downsample if needed)')
-    real_parser.add_argument('--patch-size', type=float, default=10.0,
-                           help='Patch radius in degrees')
+    real_parser.add_argument('--patch-size', type=degrees, default=math.radians(10.0),
+                           dest='patch_radius', help='Patch radius in degrees')
     real_parser.add_argument('--min-corr', type=float, default=0.3,
                            help='Minimum correlation threshold')
     real_parser.add_argument('--n-samples', type=int, default=5000,
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Shared plotting setup for the analysis scripts
+Import before matplotlib.pyplot, so the backend choice takes effect
+"""
+
+import io
+import os
+import sys
+import matplotlib
+
+# Render off-screen when there is no display to show figures on
+HEADLESS = sys.platform.startswith('linux') and not (
+    os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+if HEADLESS:
+    matplotlib.use('Agg')
+
+def save_figure(fig, path, **savefig_kwargs):
+    """
+    Render fig to memory, write it out in one call and move it into place
+    Avoids many small writes on slow (network) filesystems and never
+    leaves a half-written image behind
+    """
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', **savefig_kwargs)
+    
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(buffer.getbuffer())
+    os.replace(tmp_path, path)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Accuracy checks for the patch correlation search in analyze_real_cmb.py
+Compares the fast window correlations against np.corrcoef on the same windows
+"""
+
+import sys
+
+import numpy as np
+
+import analyze_real_cmb
+
+# Largest |r - np.corrcoef| accepted from either implementation
+TOLERANCE = 1e-6
+
+def _random_walk(n, seed=0):
+    """Non-stationary float32 test signal: a random walk on a large offset"""
+    rng = np.random.default_rng(seed)
+    return (2.725 + 1e-3 * np.cumsum(rng.standard_normal(n))).astype(np.float32)
+
+def _search_inputs(data, patch_size, n_samples, seed=1):
+    """(starts1, starts2) as analyze_cmb_correlations builds them"""
+    rng = np.random.default_rng(seed)
+    n = len(data)
+    starts1 = rng.choice(n - patch_size, size=n_samples, replace=False)
+    separations = np.array([n // 4, n // 2, 3 * n // 4])
+    starts2 = np.minimum((starts1[:, None] + separations) % n, n - patch_size)
+    return starts1, starts2
+
+def _reference(data, starts1, starts2, patch_size):
+    """np.corrcoef of every window pair, in float64"""
+    data = data.astype(np.float64)
+    return np.array([[np.corrcoef(data[i:i + patch_size], data[j:j + patch_size])[0, 1]
+                      for j in row] for i, row in zip(starts1, starts2)])
+
+def _implementations():
+    """(name, correlate) for the numba kernel (if installed) and the NumPy path"""
+    implementations = [("NumPy", analyze_real_cmb.window_correlations_blocked)]
+    if analyze_real_cmb.numba is not None:
+        implementations.insert(0, ("numba", analyze_real_cmb.window_correlations))
+    return implementations
+
+def test_nonstationary_matches_corrcoef():
+    """Random-walk data, where the window means drift far from the global mean"""
+    patch_size = 2000
+    data = _random_walk(400_000)
+    starts1, starts2 = _search_inputs(data, patch_size, n_samples=200)
+    reference = _reference(data, starts1, starts2, patch_size)
+
+    for name, correlate in _implementations():
+        correlations = correlate(data, starts1, starts2, patch_size)
+        error = np.max(np.abs(correlations - reference))
+        print(f"  {name}: max |r - corrcoef| = {error:.1e}")
+        assert error < TOLERANCE, f"{name} correlations off by {error:.1e}"
+
+def test_flat_segment_deep_in_long_map():
+    """Flat patches far into a full-size map, on a large offset"""
+    patch_size = 2000
+    n = 30_000_000  # About the pixel count of an nside-2048 map after masking
+    data = _random_walk(n)
+    flat_start = n - 100_000
+    data[flat_start:flat_start + 5 * patch_size] = data[flat_start]
+
+    # Flat with flat, flat with noisy, and noisy with flat
+    starts1 = np.array([flat_start + 10, flat_start + 20, 1000])
+    starts2 = np.array([[flat_start + 3 * patch_size], [5000], [flat_start + patch_size]])
+
+    for name, correlate in _implementations():
+        correlations = correlate(data, starts1, starts2, patch_size)
+        print(f"  {name}: r = {correlations.ravel()}")
+        assert np.isnan(correlations).all(), f"{name} gave a correlation for a flat patch"
+
+def main():
+    """Run all checks"""
+    print("🔬 LoopScan correlation accuracy checks")
+    print("=" * 50)
+
+    all_passed = True
+    for check in (test_nonstationary_matches_corrcoef, test_flat_segment_deep_in_long_map):
+        print(f"\n{check.__doc__}...")
+        try:
+            check()
+            print("  ✓ Passed")
+        except AssertionError as e:
+            print(f"  ✗ Failed: {e}")
+            all_passed = False
+
+    return all_passed
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)